@@ -0,0 +1,199 @@
+"""Prometheus instrumentation for the API.
+
+Collects per-route HTTP counts and latency, Mongo command timings and
+connection-pool gauges (through pymongo's monitoring listeners), thread pool
+queue/run times and event-loop lag, and renders them for ``GET /metrics``.
+
+With several workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+shared by all of them: every worker then writes its samples there and a
+scrape of any worker returns the sum over all of them.
+"""
+import asyncio
+import os
+from typing import Callable, Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to produce a response", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round-trip time", ["collection", "command"],
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Mongo commands that failed", ["collection", "command"]
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections", "Open connections in the Mongo pool", ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use", "Connections checked out of the Mongo pool", ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_WAITING = Gauge(
+    "mongo_pool_checkouts_waiting", "Operations waiting for a Mongo connection", ["address"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts", ["address", "reason"]
+)
+EXECUTOR_WAIT = Histogram(
+    "executor_queue_wait_seconds", "Time a call waited for a worker thread", ["executor"],
+    buckets=LATENCY_BUCKETS,
+)
+EXECUTOR_RUN = Histogram(
+    "executor_run_seconds", "Time a call ran on a worker thread", ["executor"],
+    buckets=LATENCY_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_LATENCY.labels(method, route).observe(seconds)
+
+
+def observe_executor(name: str, wait: float, run: float):
+    EXECUTOR_WAIT.labels(name).observe(wait)
+    EXECUTOR_RUN.labels(name).observe(run)
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command, labelled by collection and command name."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        if not isinstance(target, str):
+            target = command.get("collection", "")
+        self._collections[(event.connection_id, event.request_id)] = target
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks open, checked-out and waiting connections per server."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        address = _address(event)
+        MONGO_POOL_CONNECTIONS.labels(address).set(0)
+        MONGO_POOL_IN_USE.labels(address).set(0)
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_WAITING.labels(_address(event)).inc()
+
+    def connection_check_out_failed(self, event):
+        address = _address(event)
+        MONGO_POOL_WAITING.labels(address).dec()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(address, str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        address = _address(event)
+        MONGO_POOL_WAITING.labels(address).dec()
+        MONGO_POOL_IN_USE.labels(address).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.labels(_address(event)).dec()
+
+
+def mongo_listeners() -> list:
+    return [CommandMetrics(), PoolMetrics()]
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL_SECONDS):
+    """Sleep in a loop and record how much later than asked each wake-up was."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - start - interval, 0.0))
+
+
+class SnapshotCollector:
+    """Exposes the numeric fields of in-process ``snapshot()`` dicts as gauges.
+
+    These only describe the worker that answers the scrape, so they are left
+    out in multiprocess mode; ``GET /metrics/snapshot`` still returns them.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, snapshot: Callable[[], dict]):
+        self._sources[name] = snapshot
+
+    def collect(self):
+        for name, snapshot in self._sources.items():
+            for key, value in snapshot().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                yield GaugeMetricFamily(f"sat_{name}_{key}", f"{name} {key}", value=value)
+
+
+snapshots = SnapshotCollector()
+REGISTRY.register(snapshots)
+
+
+def render() -> tuple:
+    """Return the current exposition body and its content type."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared multiprocess directory."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
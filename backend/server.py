@@ -1,40 +1,195 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, Query, Request, Response, UploadFile, status
+from fastapi import Path as PathParam
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.routing import Match
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING, TEXT, DeleteMany, IndexModel, ReturnDocument, UpdateOne
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from gridfs.errors import NoFile
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, ValidationError, model_validator
+from typing import Iterable, List, Optional
 import uuid
-from datetime import datetime, timedelta
+import base64
+import re
+import codecs
+import csv
+import hashlib
+import io
+import math
+import secrets
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 import bcrypt
 import jwt
+import orjson
+from PIL import Image, ImageOps, UnidentifiedImageError
 from enum import Enum
 
+import metrics
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection; each worker process creates its own client in the app
+# lifespan, inside the event loop that will use it
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client: Optional[AsyncIOMotorClient] = None
+db = None
+# Read-mostly endpoints (feed, favorites, nearby, search) go through read_db,
+# which may be served by secondaries; auth and writes always use db (primary)
+read_db = None
+# GridFS bucket holding restaurant logos and their thumbnails
+media = None
+READINESS_TIMEOUT_SECONDS = 2
+
+# Connection pool and timeouts for the Motor client
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+}
+# MongoDB rejects max staleness below 90 seconds
+MONGO_READ_FROM_SECONDARIES = os.environ.get('MONGO_READ_FROM_SECONDARIES', 'true').lower() == 'true'
+MONGO_READ_MAX_STALENESS_SECONDS = max(int(os.environ.get('MONGO_READ_MAX_STALENESS_SECONDS', 90)), 90)
 
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-this')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', 30))
+# A token rotated this recently may be presented again without counting as
+# theft: two tabs sharing one session can both refresh at the same moment
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = float(os.environ.get('REFRESH_TOKEN_REUSE_GRACE_SECONDS', 30))
+
+# Password hashing runs in its own thread pool so bcrypt never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 32))
+
+# Token-bucket limits on auth endpoints, checked before any bcrypt work.
+# Each limit is a burst size plus a refill rate in attempts per minute.
+AUTH_RATE_LIMIT_ENABLED = os.environ.get('AUTH_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+AUTH_IP_BURST = int(os.environ.get('AUTH_IP_BURST', 20))
+AUTH_IP_PER_MINUTE = float(os.environ.get('AUTH_IP_PER_MINUTE', 20))
+AUTH_EMAIL_BURST = int(os.environ.get('AUTH_EMAIL_BURST', 5))
+AUTH_EMAIL_PER_MINUTE = float(os.environ.get('AUTH_EMAIL_PER_MINUTE', 5))
+AUTH_RATE_LIMIT_MAX_KEYS = int(os.environ.get('AUTH_RATE_LIMIT_MAX_KEYS', 100000))
+# Peers whose X-Real-IP header is trusted (the local nginx)
+TRUSTED_PROXIES = set(os.environ.get('TRUSTED_PROXIES', '127.0.0.1').split(','))
+
+# Authenticated user cache
+USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true'
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+
+# user id -> restaurant {id, name, address}; a profile never changes once created
+RESTAURANT_CACHE_SIZE = int(os.environ.get('RESTAURANT_CACHE_SIZE', 10000))
+RESTAURANT_CACHE_TTL_SECONDS = float(os.environ.get('RESTAURANT_CACHE_TTL_SECONDS', 3600))
+
+# Pickup windows: free-form "HH:MM-HH:MM" pickup_time strings are read in this
+# zone, and a background sweeper retires boxes whose window has ended
+PICKUP_TIMEZONE = ZoneInfo(os.environ.get('PICKUP_TIMEZONE', 'Asia/Almaty'))
+PICKUP_SWEEP_INTERVAL_SECONDS = float(os.environ.get('PICKUP_SWEEP_INTERVAL_SECONDS', 60))
+PICKUP_TIME_PATTERN = re.compile(r"^\s*(\d{1,2})[:.](\d{2})\s*[-–—]\s*(\d{1,2})[:.](\d{2})\s*$")
+
+# Restaurant analytics: daily rollups per restaurant, with days cut in
+# PICKUP_TIMEZONE. Boxes count on the day they were posted and orders on the
+# day they were placed. Each run recomputes the last STATS_LOOKBACK_DAYS days,
+# so a box that sells out or expires after midnight still updates its day.
+STATS_ROLLUP_INTERVAL_SECONDS = float(os.environ.get('STATS_ROLLUP_INTERVAL_SECONDS', 300))
+STATS_LOOKBACK_DAYS = int(os.environ.get('STATS_LOOKBACK_DAYS', 2))
+MAX_STATS_DAYS = 366
+
+# Periodic jobs (expiry sweep, stats rollup) run in one worker at a time. The
+# runner holds a lease document and renews it on every run; another worker
+# takes the job over once the lease goes unrenewed for LEASE_INTERVALS runs.
+WORKER_ID = str(uuid.uuid4())
+LEASE_INTERVALS = 2
+
+# Restaurant logos: originals and thumbnails live in GridFS; thumbnails are
+# rendered once at upload and served under content-hash names
+LOGO_MAX_BYTES = int(os.environ.get('LOGO_MAX_BYTES', 5 * 1024 * 1024))
+LOGO_MAX_PIXELS = 40_000_000
+LOGO_SIZES = {"sm": 64, "md": 128, "lg": 256}
+LOGO_THUMBNAIL_FORMAT = "WEBP"
+LOGO_THUMBNAIL_MEDIA_TYPE = "image/webp"
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_CHUNK_SIZE = 64 * 1024
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_MAX_QUEUE = int(os.environ.get('IMAGE_MAX_QUEUE', 8))
+
+# Box listing pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+BOX_PAGE_SORT = [("created_at", -1), ("id", -1)]
+
+# Bulk box creation
+MAX_BULK_BOXES = int(os.environ.get('MAX_BULK_BOXES', 1000))
+BULK_INSERT_BATCH_SIZE = 200
+
+# Shared cache of rendered /boxes pages
+FEED_CACHE_SIZE = int(os.environ.get('FEED_CACHE_SIZE', 256))
+FEED_CACHE_TTL_SECONDS = float(os.environ.get('FEED_CACHE_TTL_SECONDS', 30))
+
+# Live box event stream
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 256))
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Full-text search
+MAX_SEARCH_SKIP = 1000
+
+# Most favorites added or removed by one batch request
+MAX_FAVORITES_BATCH = 100
+
+# Facet bucket lower bounds; the last one is open-ended ("and above")
+DISCOUNT_BUCKETS = [0, 25, 50, 75]
+PRICE_BUCKETS = [0, 1000, 2000, 3000, 5000]
+
+# Nearby search radius, in meters
+DEFAULT_NEARBY_RADIUS = 3000
+MAX_NEARBY_RADIUS = 50000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_db()
+    await ensure_indexes()
+    await run_migrations()
+    start_background_tasks()
+    try:
+        yield
+    finally:
+        await stop_background_tasks()
+        client.close()
+        password_executor.shutdown()
+        image_executor.shutdown()
+        metrics.mark_process_dead()
 
 # Create the main app without a prefix
-app = FastAPI(title="Sät API", description="Kazakh food-saving platform API")
+app = FastAPI(title="Sät API", description="Kazakh food-saving platform API", lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 class UserRole(str, Enum):
     CUSTOMER = "customer"
@@ -46,6 +201,40 @@ class CategoryEnum(str, Enum):
     SALADS = "Салаты"
     HOT_DISHES = "Горячие блюда"
 
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize to the naive-UTC datetimes stored everywhere else."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def parse_pickup_window(pickup_time: str, now: Optional[datetime] = None) -> tuple:
+    """Turn an "18:00-20:00" pickup_time into today's (start, end) in naive UTC.
+
+    A window that ends before it starts runs past midnight: before its end
+    time that is the window that began last night, otherwise the one that
+    begins tonight. A window that has already ended today is taken to mean
+    tomorrow. Strings that are not a time range yield ``(None, None)`` and
+    the box never expires.
+    """
+    match = PICKUP_TIME_PATTERN.match(pickup_time or "")
+    if not match:
+        return None, None
+    start_h, start_m, end_h, end_m = (int(part) for part in match.groups())
+    if start_h > 23 or end_h > 23 or start_m > 59 or end_m > 59:
+        return None, None
+    today = (now or datetime.now(PICKUP_TIMEZONE)).astimezone(PICKUP_TIMEZONE)
+    start = today.replace(hour=start_h, minute=start_m, second=0, microsecond=0)
+    end = today.replace(hour=end_h, minute=end_m, second=0, microsecond=0)
+    if end <= start:
+        if today < end:
+            start -= timedelta(days=1)
+        else:
+            end += timedelta(days=1)
+    if end <= today:
+        start += timedelta(days=1)
+        end += timedelta(days=1)
+    return to_naive_utc(start), to_naive_utc(end)
+
 # Pydantic Models
 class UserCreate(BaseModel):
     name: str
@@ -71,7 +260,10 @@ class Restaurant(BaseModel):
     description: str
     address: str
     logo: Optional[str] = None
+    logo_thumbnails: Optional[dict] = None
     phone: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class RestaurantCreate(BaseModel):
@@ -79,6 +271,8 @@ class RestaurantCreate(BaseModel):
     description: str
     address: str
     phone: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class Box(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -90,6 +284,8 @@ class Box(BaseModel):
     price_before: float
     price_after: float
     pickup_time: str
+    pickup_start: Optional[datetime] = None
+    pickup_end: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     is_available: bool = True
 
@@ -98,9 +294,22 @@ class BoxCreate(BaseModel):
     description: str
     category: CategoryEnum
     quantity: int
-    price_before: float
-    price_after: float
+    price_before: float = Field(..., ge=0)
+    price_after: float = Field(..., ge=0)
     pickup_time: str
+    pickup_start: Optional[datetime] = None
+    pickup_end: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def resolve_pickup_window(self):
+        # Explicit datetimes win; otherwise derive today's window from pickup_time
+        if self.pickup_start is None and self.pickup_end is None:
+            self.pickup_start, self.pickup_end = parse_pickup_window(self.pickup_time)
+        self.pickup_start = to_naive_utc(self.pickup_start)
+        self.pickup_end = to_naive_utc(self.pickup_end)
+        if self.pickup_start and self.pickup_end and self.pickup_end <= self.pickup_start:
+            raise ValueError("pickup_end must be after pickup_start")
+        return self
 
 class Favorite(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -117,10 +326,22 @@ class Order(BaseModel):
     status: str = "pending"
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class FavoriteBatch(BaseModel):
+    add: List[str] = Field(default_factory=list, max_length=MAX_FAVORITES_BATCH)
+    remove: List[str] = Field(default_factory=list, max_length=MAX_FAVORITES_BATCH)
+
+class OrderCreate(BaseModel):
+    box_id: str
+    quantity: int = Field(1, ge=1)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 # Helper functions
 def hash_password(password: str) -> str:
@@ -129,6 +350,475 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+class BoundedExecutor:
+    """Thread pool for blocking calls that sheds load once its queue is full.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue`` more
+    wait for a thread; anything beyond that is rejected with 503 instead of
+    piling up behind a burst. Queue wait and run time are tracked per call.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._max_workers = max_workers
+        self._limit = max_workers + max_queue
+        self._in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+        self.run_seconds_max = 0.0
+
+    async def run(self, fn, *args):
+        if self._in_flight >= self._limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started, time.perf_counter()
+
+        self._in_flight += 1
+        submitted = time.perf_counter()
+        try:
+            result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                self._executor, timed
+            )
+        finally:
+            self._in_flight -= 1
+        self._record(started - submitted, finished - started)
+        return result
+
+    def _record(self, wait: float, run: float):
+        metrics.observe_executor(self.name, wait, run)
+        self.calls += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.run_seconds_total += run
+        self.run_seconds_max = max(self.run_seconds_max, run)
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self._max_workers,
+            "in_flight": self._in_flight,
+            "queued": max(self._in_flight - self._max_workers, 0),
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "run_seconds_total": self.run_seconds_total,
+            "run_seconds_max": self.run_seconds_max,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_executor = BoundedExecutor("bcrypt", PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+image_executor = BoundedExecutor("thumbnails", IMAGE_WORKERS, IMAGE_MAX_QUEUE)
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+class TokenBucketLimiter:
+    """Per-key token buckets kept in a bounded LRU.
+
+    Each key may spend up to ``burst`` attempts at once, refilled at
+    ``per_minute``. Once ``maxsize`` keys are tracked, the least recently
+    used bucket is evicted; an evicted key simply starts again with a full
+    bucket.
+    """
+
+    def __init__(self, burst: int, per_minute: float, maxsize: int, enabled: bool = True):
+        if enabled and (burst < 1 or per_minute <= 0):
+            raise ValueError(
+                "Rate limits need a burst of at least 1 and a positive refill rate; "
+                "set AUTH_RATE_LIMIT_ENABLED=false to turn them off"
+            )
+        self.burst = burst
+        self.rate = per_minute / 60
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def check(self, key: str) -> float:
+        """Return 0 if ``key`` has a token to spend, else seconds until it will.
+
+        Nothing is spent; call ``spend`` once every limiter involved allows
+        the attempt.
+        """
+        if not self.enabled:
+            return 0.0
+        tokens = self._tokens(key, time.monotonic())
+        if tokens >= 1:
+            return 0.0
+        self.rejected += 1
+        return (1 - tokens) / self.rate
+
+    def spend(self, key: str):
+        """Take one token for ``key``, which ``check`` has just allowed."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        tokens = self._tokens(key, now)
+        self._buckets.pop(key, None)
+        self._buckets[key] = (tokens - 1, now)
+        self.allowed += 1
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+auth_ip_limiter = TokenBucketLimiter(
+    AUTH_IP_BURST, AUTH_IP_PER_MINUTE, AUTH_RATE_LIMIT_MAX_KEYS, enabled=AUTH_RATE_LIMIT_ENABLED
+)
+auth_email_limiter = TokenBucketLimiter(
+    AUTH_EMAIL_BURST, AUTH_EMAIL_PER_MINUTE, AUTH_RATE_LIMIT_MAX_KEYS, enabled=AUTH_RATE_LIMIT_ENABLED
+)
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else ""
+    if peer in TRUSTED_PROXIES:
+        return request.headers.get("x-real-ip", peer)
+    return peer
+
+def check_auth_rate_limit(request: Request, email: str):
+    # Spend from the buckets only when all of them allow the attempt, so
+    # attempts blocked by the IP limit never drain the per-email bucket
+    buckets = ((auth_ip_limiter, client_ip(request)), (auth_email_limiter, email.lower()))
+    wait = max(limiter.check(key) for limiter, key in buckets)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(max(math.ceil(wait), 1))},
+        )
+    for limiter, key in buckets:
+        limiter.spend(key)
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS, enabled=USER_CACHE_ENABLED)
+
+def invalidate_user(user_id: str):
+    """Drop a cached user; call after any write to that user's document."""
+    user_cache.invalidate(user_id)
+
+restaurant_cache = TTLCache(RESTAURANT_CACHE_SIZE, RESTAURANT_CACHE_TTL_SECONDS)
+
+async def get_restaurant_ref(user_id: str) -> Optional[dict]:
+    """Resolve the ``{id, name, address}`` of the restaurant a user owns, memoized per process."""
+    restaurant = restaurant_cache.get(user_id)
+    if restaurant is not None:
+        return restaurant
+    
+    restaurant = await db.restaurants.find_one({"user_id": user_id}, {"_id": 0, "id": 1, "name": 1, "address": 1})
+    if not restaurant:
+        return None
+    restaurant_cache.set(user_id, restaurant)
+    return restaurant
+
+class FeedCache:
+    """Rendered feed pages shared by all customers, invalidated by version.
+
+    Write paths that change what the feed shows call ``bump()``. Pages built
+    while a bump happened are not stored, and the TTL bounds staleness for
+    writes made by other processes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.version = 0
+        self._pages = TTLCache(maxsize, ttl)
+
+    def get(self, params: tuple):
+        return self._pages.get((self.version, params))
+
+    def set(self, version: int, params: tuple, page):
+        if version == self.version:
+            self._pages.set((version, params), page)
+
+    def bump(self):
+        self.version += 1
+        self._pages.clear()
+
+    def snapshot(self) -> dict:
+        lookups = self._pages.hits + self._pages.misses
+        return {
+            **self._pages.snapshot(),
+            "version": self.version,
+            "hit_ratio": self._pages.hits / lookups if lookups else 0.0,
+        }
+
+feed_cache = FeedCache(FEED_CACHE_SIZE, FEED_CACHE_TTL_SECONDS)
+
+class EventBroker:
+    """In-process pub/sub that fans box change events out to stream subscribers.
+
+    Each subscriber gets a bounded queue. A subscriber that falls behind has
+    its backlog replaced by a single ``resync`` event telling the client to
+    refetch the feed, so one slow connection never holds up publishers.
+    """
+
+    def __init__(self, queue_size: int):
+        self._queue_size = queue_size
+        self._subscribers = set()
+        self.published = 0
+        self.resyncs = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict):
+        self.published += 1
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                self.resyncs += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "resyncs": self.resyncs,
+        }
+
+box_events = EventBroker(STREAM_QUEUE_SIZE)
+
+async def acquire_lease(name: str, interval: float) -> bool:
+    """Take or renew the named job lease for this worker; False if another worker holds it."""
+    now = datetime.utcnow()
+    try:
+        await db.leases.find_one_and_update(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + timedelta(seconds=interval * LEASE_INTERVALS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by a live worker
+        return False
+    return True
+
+async def release_leases():
+    """Give up this worker's leases so a replacement can take over right away."""
+    try:
+        await db.leases.delete_many({"holder": WORKER_ID})
+    except PyMongoError:
+        logger.warning("Could not release job leases", exc_info=True)
+
+async def expire_boxes() -> int:
+    """Retire available boxes whose pickup window has ended; returns how many."""
+    now = datetime.utcnow()
+    expired = await db.boxes.find(
+        {"is_available": True, "pickup_end": {"$lte": now}}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    if not expired:
+        return 0
+    box_ids = [box["id"] for box in expired]
+    await db.boxes.update_many(
+        {"id": {"$in": box_ids}, "is_available": True},
+        {"$set": {"is_available": False}},
+    )
+    feed_cache.bump()
+    for box_id in box_ids:
+        box_events.publish({"type": "box.expired", "box_id": box_id})
+    return len(box_ids)
+
+async def sweep_expired_boxes():
+    while True:
+        try:
+            if await acquire_lease("sweep_expired_boxes", PICKUP_SWEEP_INTERVAL_SECONDS):
+                expired = await expire_boxes()
+                if expired:
+                    logger.info("Retired %d boxes past their pickup window", expired)
+        except Exception:
+            logger.exception("Pickup window sweep failed")
+        await asyncio.sleep(PICKUP_SWEEP_INTERVAL_SECONDS)
+
+def stats_day(date_field: str) -> dict:
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": date_field, "timezone": PICKUP_TIMEZONE.key}}
+
+def rollup_stages(counters: dict, categories_field: str) -> List[dict]:
+    """Group rows into one document per (restaurant, day) and $merge it into
+    restaurant_stats_daily, keeping a per-category breakdown of the same counters.
+    """
+    return [
+        {"$group": {
+            "_id": {"restaurant_id": "$restaurant_id", "day": stats_day("$created_at"), "category": "$category"},
+            **counters,
+        }},
+        {"$group": {
+            "_id": {"restaurant_id": "$_id.restaurant_id", "day": "$_id.day"},
+            **{name: {"$sum": f"${name}"} for name in counters},
+            "categories": {"$push": {
+                "k": "$_id.category",
+                "v": {name: f"${name}" for name in counters},
+            }},
+        }},
+        {"$project": {
+            "_id": 0,
+            "restaurant_id": "$_id.restaurant_id",
+            "day": "$_id.day",
+            **{name: 1 for name in counters},
+            categories_field: {"$arrayToObject": "$categories"},
+            "updated_at": "$$NOW",
+        }},
+        {"$merge": {
+            "into": "restaurant_stats_daily",
+            "on": ["restaurant_id", "day"],
+            "whenMatched": "merge",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+async def refresh_restaurant_stats(full_history: bool = False):
+    """Recompute the daily rollups of the last STATS_LOOKBACK_DAYS days, or of
+    every day on record when ``full_history`` is set.
+
+    Boxes and orders are aggregated separately; both $merge into the same
+    per-day document without touching each other's fields.
+    """
+    window = {}
+    if not full_history:
+        today = datetime.now(PICKUP_TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        window = {"created_at": {"$gte": to_naive_utc(today - timedelta(days=STATS_LOOKBACK_DAYS - 1))}}
+    
+    await db.boxes.aggregate([
+        {"$match": window},
+        *rollup_stages({
+            "boxes_posted": {"$sum": 1},
+            "boxes_sold_out": {"$sum": {"$cond": [{"$eq": ["$quantity", 0]}, 1, 0]}},
+            "boxes_expired": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$is_available", False]}, {"$gt": ["$quantity", 0]}]}, 1, 0
+            ]}},
+        }, "box_categories"),
+    ], allowDiskUse=True).to_list(None)
+    await db.orders.aggregate([
+        {"$match": {**window, "restaurant_id": {"$exists": True}}},
+        *rollup_stages({
+            "orders": {"$sum": 1},
+            "units_sold": {"$sum": "$quantity"},
+            "revenue": {"$sum": "$total_price"},
+            "customer_savings": {"$sum": "$customer_savings"},
+        }, "order_categories"),
+    ], allowDiskUse=True).to_list(None)
+
+async def refresh_stats_periodically():
+    while True:
+        try:
+            if await acquire_lease("refresh_restaurant_stats", STATS_ROLLUP_INTERVAL_SECONDS):
+                await refresh_restaurant_stats()
+        except Exception:
+            logger.exception("Restaurant stats rollup failed")
+        await asyncio.sleep(STATS_ROLLUP_INTERVAL_SECONDS)
+
+def publish_stock_change(box: dict):
+    """Announce a box's new quantity after an order or other stock change."""
+    box_events.publish({
+        "type": "box.updated" if box["is_available"] else "box.sold_out",
+        "box_id": box["id"],
+        "quantity": box["quantity"],
+        "is_available": box["is_available"],
+    })
+
+async def reserve_box(box_id: str, quantity: int) -> Optional[dict]:
+    """Atomically take ``quantity`` units of an available box.
+
+    The stock check and decrement happen in one conditional update, so
+    concurrent orders can never drive ``quantity`` below zero; the box is
+    marked unavailable by the same update once it sells out. Returns the
+    updated box, or None if the box is gone or lacks stock.
+    """
+    return await db.boxes.find_one_and_update(
+        {"id": box_id, "quantity": {"$gte": quantity}, **live_box_filter()},
+        [
+            {"$set": {"quantity": {"$subtract": ["$quantity", quantity]}}},
+            {"$set": {"is_available": {"$gt": ["$quantity", 0]}}},
+        ],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def release_box(box_id: str, quantity: int) -> Optional[dict]:
+    """Give back units taken by reserve_box when their order could not be recorded.
+
+    A box whose pickup window has ended meanwhile is still hidden by
+    live_box_filter and retired again by the next sweep.
+    """
+    return await db.boxes.find_one_and_update(
+        {"id": box_id},
+        {"$inc": {"quantity": quantity}, "$set": {"is_available": True}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -136,57 +826,329 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def restaurant_lookup_stages() -> List[dict]:
+    """Aggregation stages that join a box with its restaurant's name, address and small logo.
+
+    Replaces the per-box ``restaurants.find_one`` loop so a whole feed page is
+    resolved in one round trip. Boxes whose restaurant is gone keep the old
+    "Unknown"/"" placeholders.
+    """
+    return [
+        {"$lookup": {
+            "from": "restaurants",
+            "localField": "restaurant_id",
+            "foreignField": "id",
+            "as": "restaurant",
+        }},
+        {"$addFields": {
+            "restaurant_name": {"$ifNull": [{"$arrayElemAt": ["$restaurant.name", 0]}, "Unknown"]},
+            "restaurant_address": {"$ifNull": [{"$arrayElemAt": ["$restaurant.address", 0]}, ""]},
+            "restaurant_logo": {"$ifNull": [{"$arrayElemAt": ["$restaurant.logo_thumbnails.sm", 0]}, None]},
+        }},
+        {"$project": {"_id": 0, "restaurant": 0}},
+    ]
+
+def encode_cursor(doc: dict) -> str:
+    payload = json.dumps({"c": doc["created_at"].isoformat(), "i": doc["id"]})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(payload["c"]), str(payload["i"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def bucket_ranges(rows: List[dict], boundaries: List[float]) -> List[dict]:
+    """Turn $bucket output into ``{min, max, count}`` rows for every bucket.
+
+    The last boundary doubles as the open-ended "and above" bucket, whose
+    ``max`` is None. Empty buckets are reported with a zero count.
+    """
+    counts = {row["_id"]: row["count"] for row in rows}
+    ranges = [
+        {"min": low, "max": high, "count": counts.get(low, 0)}
+        for low, high in zip(boundaries, boundaries[1:])
+    ]
+    ranges.append({"min": boundaries[-1], "max": None, "count": counts.get(boundaries[-1], 0)})
+    return ranges
+
+async def serve_from_feed_cache(request: Request, params: tuple, build, personalize=None) -> Response:
+    """Serve a response shared by all customers from feed_cache, with ETag/304.
+
+    ``build`` is awaited on a miss and returns the JSON-able data plus the
+    next page cursor (or None). ``personalize``, if given, derives a
+    per-user variant from the cached data without modifying it.
+    """
+    page = feed_cache.get(params)
+    if page is None:
+        version = feed_cache.version
+        data, next_cursor = await build()
+        body = orjson.dumps(data)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        page = (body, etag, next_cursor, data)
+        feed_cache.set(version, params, page)
+    
+    body, etag, next_cursor, data = page
+    if personalize is not None:
+        body = orjson.dumps(await personalize(data))
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def live_box_filter() -> dict:
+    """Boxes a customer can still order: available and pickup window not over.
+
+    Between sweeps this hides boxes whose window has just ended; boxes without
+    a pickup_end never expire.
+    """
+    return {"is_available": True, "pickup_end": {"$not": {"$lte": datetime.utcnow()}}}
+
+def box_page_query(
+    query: dict,
+    cursor: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> dict:
+    """Extend a box filter with listing filters and the keyset condition.
+
+    Pages are ordered by ``(created_at, id)`` descending, so the next page is
+    everything strictly older than the last box of the previous one.
+    """
+    query = dict(query)
+    if category is not None:
+        query["category"] = category.value
+    if min_price is not None or max_price is not None:
+        price = {}
+        if min_price is not None:
+            price["$gte"] = min_price
+        if max_price is not None:
+            price["$lte"] = max_price
+        query["price_after"] = price
+    if cursor:
+        created_at, box_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": box_id}},
+        ]
+    return query
+
+def split_page(docs: List[dict], limit: int) -> tuple:
+    """Trim a ``limit + 1`` fetch to ``limit``, returning the docs and next cursor."""
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, so a fast hash is enough at rest
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def create_refresh_token(user_id: str) -> str:
+    """Issue an opaque refresh token; only its hash is stored."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.refresh_tokens.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "token_hash": hash_refresh_token(token),
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "revoked_at": None,
+    })
+    return token
+
+async def revoke_refresh_tokens(user_id: str, reason: str):
+    """Revoke every outstanding refresh token of a user."""
+    await db.refresh_tokens.update_many(
+        {"user_id": user_id, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}},
+    )
+
+async def issue_tokens(user: User) -> Token:
+    return Token(
+        access_token=create_access_token(data={"sub": user.id}),
+        token_type="bearer",
+        user=user,
+        refresh_token=await create_refresh_token(user.id),
+    )
+
+async def load_user(user_id: str) -> User:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user_doc = await db.users.find_one({"id": user_id})
+    if user_doc is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    user = User(**user_doc)
+    user_cache.set(user_id, user)
+    return user
+
+async def authenticate(token: str) -> User:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"id": user_id})
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    return await load_user(user_id)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate(credentials.credentials)
+
+def render_logo_thumbnails(data: bytes) -> dict:
+    """Decode an uploaded logo and render every LOGO_SIZES square thumbnail.
+
+    Runs on the image executor; returns ``{size_name: encoded_bytes}``.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > LOGO_MAX_PIXELS:
+            raise ValueError("Image dimensions are too large")
+        image = ImageOps.exif_transpose(image).convert("RGBA")
+    thumbnails = {}
+    for name, side in LOGO_SIZES.items():
+        thumbnail = ImageOps.fit(image, (side, side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, LOGO_THUMBNAIL_FORMAT, quality=85, method=6)
+        thumbnails[name] = buffer.getvalue()
+    return thumbnails
+
+def media_name(data: bytes) -> str:
+    return f"{hashlib.sha256(data).hexdigest()[:32]}.{LOGO_THUMBNAIL_FORMAT.lower()}"
+
+async def prune_logo_files(restaurant_id: str, original_id, old_urls: dict, new_urls: dict):
+    """Delete a replaced logo's original and any of its thumbnails no restaurant still uses.
+
+    Thumbnails are content-addressed and may be shared with another restaurant
+    that uploaded the same image, so each one is only removed once unreferenced.
+    """
+    stale = await db["media.files"].find(
+        {"filename": {"$regex": f"^originals/{restaurant_id}/"}, "_id": {"$ne": original_id}},
+        {"_id": 1},
+    ).to_list(None)
+    for url in set(old_urls.values()) - set(new_urls.values()):
+        in_use = await db.restaurants.find_one(
+            {"$or": [{f"logo_thumbnails.{size}": url} for size in LOGO_SIZES]}, {"_id": 1}
+        )
+        if not in_use:
+            stale += await db["media.files"].find(
+                {"filename": url.rsplit("/", 1)[-1]}, {"_id": 1}
+            ).to_list(None)
+    for file in stale:
+        try:
+            await media.delete(file["_id"])
+        except NoFile:
+            pass
+
+def parse_range(header: str, length: int) -> Optional[tuple]:
+    """Parse a single ``bytes=`` range into inclusive offsets.
+
+    Returns None when the header should be ignored, and raises 416 when the
+    range cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(length - int(last), 0), length - 1
+    else:
+        start, end = int(first), min(int(last), length - 1) if last else length - 1
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"},
+        )
+    return start, end
 
 # Auth Routes
 @api_router.post("/auth/register", response_model=Token)
-async def register(user_data: UserCreate):
-    # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
-    if existing_user:
+async def register(user_data: UserCreate, request: Request):
+    check_auth_rate_limit(request, user_data.email)
+    
+    # Cheap indexed check first so a taken email never costs a bcrypt hash
+    if await db.users.find_one({"email": user_data.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password and create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await password_executor.run(hash_password, user_data.password)
     user = User(
         name=user_data.name,
         email=user_data.email,
         role=user_data.role
     )
     
-    # Save to database
+    # Save to database; the unique email index still rejects a concurrent duplicate
     user_doc = user.dict()
     user_doc["password"] = hashed_password
-    await db.users.insert_one(user_doc)
-    
-    # Create token
-    access_token = create_access_token(data={"sub": user.id})
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    return Token(access_token=access_token, token_type="bearer", user=user)
+    return await issue_tokens(user)
 
 @api_router.post("/auth/login", response_model=Token)
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, request: Request):
+    check_auth_rate_limit(request, login_data.email)
+    
     # Find user
     user_doc = await db.users.find_one({"email": login_data.email})
-    if not user_doc or not verify_password(login_data.password, user_doc["password"]):
+    if not user_doc or not await password_executor.run(
+        verify_password, login_data.password, user_doc["password"]
+    ):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user = User(**user_doc)
-    access_token = create_access_token(data={"sub": user.id})
+    return await issue_tokens(User(**user_doc))
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh(refresh_data: RefreshRequest):
+    """Exchange a refresh token for new access and refresh tokens.
+
+    The presented token is revoked in the same update that validates it, so
+    each one works once. A token rotated within the last
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS is another tab refreshing the same
+    session and gets a fresh pair too. Presenting a token rotated earlier
+    means it leaked, and every session of that user is revoked; tokens
+    revoked by logout are simply rejected.
+    """
+    now = datetime.utcnow()
+    token_hash = hash_refresh_token(refresh_data.refresh_token)
+    stored = await db.refresh_tokens.find_one_and_update(
+        {"token_hash": token_hash, "revoked_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"revoked_at": now, "revoked_reason": "rotated"}},
+        projection={"_id": 0, "user_id": 1},
+    )
+    if stored is None:
+        rotated = await db.refresh_tokens.find_one(
+            {"token_hash": token_hash, "revoked_reason": "rotated", "expires_at": {"$gt": now}},
+            {"_id": 0, "user_id": 1, "revoked_at": 1},
+        )
+        if rotated is None:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        if rotated["revoked_at"] < now - timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+            await revoke_refresh_tokens(rotated["user_id"], "reuse")
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        stored = rotated
     
-    return Token(access_token=access_token, token_type="bearer", user=user)
+    return await issue_tokens(await load_user(stored["user_id"]))
+
+@api_router.post("/auth/logout")
+async def logout(refresh_data: RefreshRequest):
+    await db.refresh_tokens.update_one(
+        {"token_hash": hash_refresh_token(refresh_data.refresh_token), "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": "logout"}},
+    )
+    return {"message": "Logged out"}
 
 @api_router.get("/auth/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
@@ -206,7 +1168,19 @@ async def create_restaurant(
         **restaurant_data.dict()
     )
     
-    await db.restaurants.insert_one(restaurant.dict())
+    restaurant_doc = restaurant.dict()
+    if restaurant.latitude is not None and restaurant.longitude is not None:
+        # GeoJSON point for the 2dsphere index; GeoJSON order is [lng, lat]
+        restaurant_doc["location"] = {
+            "type": "Point",
+            "coordinates": [restaurant.longitude, restaurant.latitude],
+        }
+    await db.restaurants.insert_one(restaurant_doc)
+    if restaurant_cache.get(current_user.id) is None:
+        restaurant_cache.set(
+            current_user.id,
+            {"id": restaurant.id, "name": restaurant.name, "address": restaurant.address}
+        )
     return restaurant
 
 @api_router.get("/restaurants/me", response_model=Restaurant)
@@ -220,70 +1194,510 @@ async def get_my_restaurant(current_user: User = Depends(get_current_user)):
     
     return Restaurant(**restaurant)
 
-# Box Routes
-@api_router.post("/boxes", response_model=Box)
-async def create_box(
-    box_data: BoxCreate,
+@api_router.post("/restaurants/me/logo", response_model=Restaurant)
+async def upload_restaurant_logo(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != UserRole.RESTAURANT:
+        raise HTTPException(status_code=403, detail="Only restaurants can upload logos")
+    
+    restaurant = await get_restaurant_ref(current_user.id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant profile not found")
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=400, detail="Logo must be an image")
+    
+    file.file.seek(0, io.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    if size > LOGO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Logo must be at most {LOGO_MAX_BYTES} bytes")
+    
+    try:
+        thumbnails = await image_executor.run(render_logo_thumbnails, file.file.read())
+    except (UnidentifiedImageError, Image.DecompressionBombError, ValueError, OSError):
+        raise HTTPException(status_code=400, detail="Could not read the image")
+    
+    # Keep the original for re-rendering later; it is never served
+    file.file.seek(0)
+    original_id = await media.upload_from_stream(
+        f"originals/{restaurant['id']}/{uuid.uuid4()}",
+        file.file,
+        metadata={"restaurant_id": restaurant["id"], "content_type": file.content_type},
+    )
+    
+    urls = {}
+    for name, data in thumbnails.items():
+        filename = media_name(data)
+        # Content-addressed: an identical thumbnail is already stored
+        if not await db["media.files"].find_one({"filename": filename}, {"_id": 1}):
+            await media.upload_from_stream(
+                filename,
+                data,
+                metadata={"restaurant_id": restaurant["id"], "content_type": LOGO_THUMBNAIL_MEDIA_TYPE},
+            )
+        urls[name] = f"/api/media/{filename}"
+    
+    previous = await db.restaurants.find_one_and_update(
+        {"id": restaurant["id"]},
+        {"$set": {"logo": urls["md"], "logo_thumbnails": urls}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+    )
+    feed_cache.bump()
+    await prune_logo_files(restaurant["id"], original_id, previous.get("logo_thumbnails") or {}, urls)
+    return Restaurant(**{**previous, "logo": urls["md"], "logo_thumbnails": urls})
+
+@api_router.get("/media/{name}")
+async def get_media(
+    request: Request,
+    name: str = PathParam(..., pattern=r"^[0-9a-f]{32}\.webp$"),
+):
+    """Serve a content-addressed thumbnail; the URL changes whenever the bytes do."""
+    etag = f'"{name}"'
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        grid_out = await media.open_download_stream_by_name(name)
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Media not found")
+    
+    length = grid_out.length
+    start, end = 0, length - 1
+    status_code = 200
+    byte_range = parse_range(request.headers.get("range", ""), length) if length else None
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1 if length else 0)
+    
+    async def chunks():
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(MEDIA_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    
+    return StreamingResponse(
+        chunks(), status_code=status_code, media_type=LOGO_THUMBNAIL_MEDIA_TYPE, headers=headers
+    )
+
+STATS_BOX_FIELDS = ("boxes_posted", "boxes_sold_out", "boxes_expired")
+STATS_ORDER_FIELDS = ("orders", "units_sold", "revenue", "customer_savings")
+
+@api_router.get("/restaurants/me/stats")
+async def get_my_restaurant_stats(
+    days: int = Query(30, ge=1, le=MAX_STATS_DAYS),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != UserRole.RESTAURANT:
+        raise HTTPException(status_code=403, detail="Only restaurants can access this endpoint")
+    
+    restaurant = await get_restaurant_ref(current_user.id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant profile not found")
+    
+    since = (datetime.now(PICKUP_TIMEZONE) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    rollups = await db.restaurant_stats_daily.find(
+        {"restaurant_id": restaurant["id"], "day": {"$gte": since}},
+        {"_id": 0, "restaurant_id": 0},
+    ).sort("day", DESCENDING).to_list(days)
+    
+    totals = {field: 0 for field in STATS_BOX_FIELDS + STATS_ORDER_FIELDS}
+    by_category = {category.value: dict(totals) for category in CategoryEnum}
+    for rollup in rollups:
+        for field in totals:
+            totals[field] += rollup.get(field, 0)
+        for categories_field in ("box_categories", "order_categories"):
+            for category, counters in rollup.get(categories_field, {}).items():
+                bucket = by_category.setdefault(category, {field: 0 for field in totals})
+                for field, value in counters.items():
+                    bucket[field] += value
+    
+    return ORJSONResponse({"totals": totals, "by_category": by_category, "days": rollups})
+
+# Box Routes
+async def get_box_owner(user: User) -> dict:
+    if user.role != UserRole.RESTAURANT:
         raise HTTPException(status_code=403, detail="Only restaurants can create boxes")
     
-    # Get restaurant
-    restaurant = await db.restaurants.find_one({"user_id": current_user.id})
+    restaurant = await get_restaurant_ref(user.id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant profile not found")
+    return restaurant
+
+def box_document(box: Box, restaurant: dict) -> dict:
+    # restaurant_name is denormalized onto the box for the text index
+    return {**box.dict(), "restaurant_name": restaurant["name"]}
+
+def publish_box_created(box: Box, restaurant: dict):
+    box_events.publish({
+        "type": "box.created",
+        "box": {
+            **box.dict(),
+            "restaurant_name": restaurant["name"],
+            "restaurant_address": restaurant["address"],
+        },
+    })
+
+async def insert_boxes(rows: Iterable[tuple], restaurant: dict) -> dict:
+    """Validate ``(row_number, row)`` pairs one at a time and insert them in batches.
+
+    Returns the number of boxes created and the validation errors per row. If
+    reading the rows fails (an undecodable or malformed CSV), the import stops
+    with an error on the row that could not be read; rows before it are kept.
+    """
+    created = 0
+    errors = []
+    batch = []
+    row_number = 0
+    
+    async def flush():
+        nonlocal created
+        await db.boxes.insert_many([box_document(box, restaurant) for box in batch], ordered=False)
+        created += len(batch)
+        for box in batch:
+            publish_box_created(box, restaurant)
+        batch.clear()
+    
+    try:
+        for row_number, row in rows:
+            if row_number > MAX_BULK_BOXES:
+                errors.append({"row": row_number, "errors": [
+                    {"field": None, "message": f"At most {MAX_BULK_BOXES} boxes per request"}
+                ]})
+                break
+            try:
+                box_data = BoxCreate(**row)
+            except ValidationError as e:
+                errors.append({"row": row_number, "errors": [
+                    {"field": ".".join(str(part) for part in err["loc"]) or None, "message": err["msg"]}
+                    for err in e.errors()
+                ]})
+                continue
+            batch.append(Box(restaurant_id=restaurant["id"], **box_data.dict()))
+            if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                await flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append({"row": row_number + 1, "errors": [
+            {"field": None, "message": f"Invalid CSV file: {e}"}
+        ]})
+    if batch:
+        await flush()
     
+    if created:
+        feed_cache.bump()
+    return {"created": created, "errors": errors}
+
+@api_router.post("/boxes", response_model=Box)
+async def create_box(
+    box_data: BoxCreate,
+    current_user: User = Depends(get_current_user)
+):
+    restaurant = await get_box_owner(current_user)
     box = Box(
         restaurant_id=restaurant["id"],
         **box_data.dict()
     )
     
-    await db.boxes.insert_one(box.dict())
+    await db.boxes.insert_one(box_document(box, restaurant))
+    feed_cache.bump()
+    publish_box_created(box, restaurant)
     return box
 
+@api_router.post("/boxes/bulk")
+async def create_boxes_bulk(
+    rows: List[dict],
+    current_user: User = Depends(get_current_user)
+):
+    """Create many boxes at once; invalid rows are reported, valid ones are kept."""
+    restaurant = await get_box_owner(current_user)
+    if len(rows) > MAX_BULK_BOXES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_BOXES} boxes per request")
+    return await insert_boxes(enumerate(rows, start=1), restaurant)
+
+@api_router.post("/boxes/import")
+async def import_boxes_csv(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Create boxes from a CSV upload whose header row names BoxCreate fields.
+
+    Rows are parsed as they are read, so the upload is never held in memory
+    as a whole; row numbers in errors count data rows from 1.
+    """
+    restaurant = await get_box_owner(current_user)
+    reader = csv.DictReader(codecs.iterdecode(file.file, 'utf-8-sig'))
+    # A blank optional cell (pickup_start, pickup_end) means "not set" rather
+    # than an empty value; csv.DictReader files surplus cells under the None key
+    optional = {name for name, field in BoxCreate.model_fields.items() if not field.is_required()}
+    rows = (
+        (row_number, {
+            key: value for key, value in row.items()
+            if key is not None and not (key in optional and value in ("", None))
+        })
+        for row_number, row in enumerate(reader, start=1)
+    )
+    return await insert_boxes(rows, restaurant)
+
 @api_router.get("/boxes", response_model=List[dict])
-async def get_boxes(current_user: User = Depends(get_current_user)):
-    boxes = await db.boxes.find({"is_available": True}, {"_id": 0}).to_list(100)
-    
-    # Populate with restaurant info
-    result = []
-    for box in boxes:
-        restaurant = await db.restaurants.find_one({"id": box["restaurant_id"]}, {"_id": 0})
-        box_with_restaurant = {
-            **box,
-            "restaurant_name": restaurant["name"] if restaurant else "Unknown",
-            "restaurant_address": restaurant["address"] if restaurant else ""
-        }
-        result.append(box_with_restaurant)
+async def get_boxes(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    include_favorites: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    async def build():
+        query = box_page_query(live_box_filter(), cursor, category, min_price, max_price)
+        pipeline = [
+            {"$match": query},
+            {"$sort": dict(BOX_PAGE_SORT)},
+            {"$limit": limit + 1},
+            *restaurant_lookup_stages(),
+        ]
+        boxes = await read_db.boxes.aggregate(pipeline).to_list(limit + 1)
+        return split_page(boxes, limit)
     
-    return result
+    async def flag_favorites(boxes):
+        # One indexed lookup for the whole page; primary so a just-toggled
+        # heart is never shown stale
+        favorites = await db.favorites.find(
+            {"user_id": current_user.id, "box_id": {"$in": [box["id"] for box in boxes]}},
+            {"_id": 0, "box_id": 1},
+        ).to_list(len(boxes))
+        favorite_ids = {favorite["box_id"] for favorite in favorites}
+        return [{**box, "is_favorite": box["id"] in favorite_ids} for box in boxes]
+    
+    return await serve_from_feed_cache(
+        request,
+        ("boxes", limit, cursor, category, min_price, max_price),
+        build,
+        personalize=flag_favorites if include_favorites else None,
+    )
+
+@api_router.get("/boxes/facets")
+async def get_box_facets(request: Request, current_user: User = Depends(get_current_user)):
+    """Counts of available boxes by category, discount and price, in one $facet."""
+    async def build():
+        pipeline = [
+            {"$match": live_box_filter()},
+            {"$project": {
+                "category": 1,
+                # $bucket's default also catches values below the first
+                # boundary; clamp boxes stored before prices were validated
+                "price_after": {"$max": [0, "$price_after"]},
+                "discount": {"$cond": [
+                    {"$gt": ["$price_before", 0]},
+                    {"$max": [0, {"$multiply": [
+                        {"$divide": [{"$subtract": ["$price_before", "$price_after"]}, "$price_before"]},
+                        100,
+                    ]}]},
+                    0,
+                ]},
+            }},
+            {"$facet": {
+                "categories": [
+                    {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                ],
+                "discounts": [
+                    {"$bucket": {
+                        "groupBy": "$discount",
+                        "boundaries": DISCOUNT_BUCKETS,
+                        "default": DISCOUNT_BUCKETS[-1],
+                    }},
+                ],
+                "prices": [
+                    {"$bucket": {
+                        "groupBy": "$price_after",
+                        "boundaries": PRICE_BUCKETS,
+                        "default": PRICE_BUCKETS[-1],
+                    }},
+                ],
+            }},
+        ]
+        facets = (await read_db.boxes.aggregate(pipeline).to_list(1))[0]
+        counts = {row["_id"]: row["count"] for row in facets["categories"]}
+        return {
+            "categories": [
+                {"category": category.value, "count": counts.get(category.value, 0)}
+                for category in CategoryEnum
+            ],
+            "discounts": bucket_ranges(facets["discounts"], DISCOUNT_BUCKETS),
+            "prices": bucket_ranges(facets["prices"], PRICE_BUCKETS),
+        }, None
+    
+    return await serve_from_feed_cache(request, ("facets",), build)
 
 @api_router.get("/boxes/my", response_model=List[Box])
-async def get_my_boxes(current_user: User = Depends(get_current_user)):
+async def get_my_boxes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[CategoryEnum] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != UserRole.RESTAURANT:
         raise HTTPException(status_code=403, detail="Only restaurants can access this endpoint")
     
-    restaurant = await db.restaurants.find_one({"user_id": current_user.id}, {"_id": 0})
+    restaurant = await get_restaurant_ref(current_user.id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant profile not found")
     
-    boxes = await db.boxes.find({"restaurant_id": restaurant["id"]}, {"_id": 0}).to_list(100)
-    return [Box(**box) for box in boxes]
+    query = box_page_query(
+        {"restaurant_id": restaurant["id"]}, cursor, category, min_price, max_price
+    )
+    boxes = await db.boxes.find(
+        query, {"_id": 0, "restaurant_name": 0}
+    ).sort(BOX_PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+    boxes, next_cursor = split_page(boxes, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    # Documents were written from Box, so skip re-validating every row
+    return ORJSONResponse(boxes, headers=headers)
+
+@api_router.get("/boxes/nearby", response_model=List[dict])
+async def get_nearby_boxes(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(DEFAULT_NEARBY_RADIUS, gt=0, le=MAX_NEARBY_RADIUS),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    # $geoNear walks restaurants nearest-first through the 2dsphere index; each
+    # restaurant's available boxes are then joined in, keeping that order.
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lng, lat]},
+            "distanceField": "distance",
+            "maxDistance": radius,
+            "spherical": True,
+        }},
+        {"$lookup": {
+            "from": "boxes",
+            "localField": "id",
+            "foreignField": "restaurant_id",
+            "pipeline": [{"$match": live_box_filter()}],
+            "as": "box",
+        }},
+        {"$unwind": "$box"},
+        {"$limit": limit},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$box", {
+            "restaurant_name": "$name",
+            "restaurant_address": "$address",
+            "restaurant_logo": {"$ifNull": ["$logo_thumbnails.sm", None]},
+            "distance": "$distance",
+        }]}}},
+        {"$project": {"_id": 0}},
+    ]
+    return ORJSONResponse(await read_db.restaurants.aggregate(pipeline).to_list(limit))
+
+@api_router.get("/boxes/search", response_model=List[dict])
+async def search_boxes(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0, le=MAX_SEARCH_SKIP),
+    current_user: User = Depends(get_current_user)
+):
+    pipeline = [
+        {"$match": {"$text": {"$search": q}, **live_box_filter()}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$sort": {"score": -1, "id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        *restaurant_lookup_stages(),
+    ]
+    return ORJSONResponse(await read_db.boxes.aggregate(pipeline).to_list(limit))
+
+@api_router.get("/boxes/stream")
+async def stream_boxes(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-sent events for box changes, so clients can patch a fetched feed.
+
+    Browsers' EventSource cannot send headers, so the access token may also be
+    passed as ``?token=``.
+    """
+    if credentials:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await authenticate(token)
+    
+    async def event_source():
+        queue = box_events.subscribe()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                data = orjson.dumps(event).decode('utf-8')
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+        finally:
+            box_events.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Favorites Routes
+@api_router.post("/favorites/batch")
+async def update_favorites_batch(batch: FavoriteBatch, current_user: User = Depends(get_current_user)):
+    """Add and remove many favorites with a single bulk write."""
+    if current_user.role != UserRole.CUSTOMER:
+        raise HTTPException(status_code=403, detail="Only customers can update favorites")
+    if set(batch.add) & set(batch.remove):
+        raise HTTPException(status_code=400, detail="A box cannot be both added and removed")
+    
+    operations = [
+        UpdateOne(
+            {"user_id": current_user.id, "box_id": box_id},
+            {"$setOnInsert": Favorite(user_id=current_user.id, box_id=box_id).dict()},
+            upsert=True,
+        )
+        for box_id in dict.fromkeys(batch.add)
+    ]
+    if batch.remove:
+        operations.append(DeleteMany({"user_id": current_user.id, "box_id": {"$in": batch.remove}}))
+    if not operations:
+        return {"added": 0, "removed": 0}
+    
+    try:
+        result = (await db.favorites.bulk_write(operations, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        # A concurrent upsert of the same favorite loses on the unique index;
+        # the favorite exists either way
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        result = e.details
+    return {"added": result["nUpserted"], "removed": result["nRemoved"]}
+
 @api_router.post("/favorites/{box_id}")
 async def add_favorite(box_id: str, current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.CUSTOMER:
         raise HTTPException(status_code=403, detail="Only customers can add favorites")
     
-    # Check if already favorited
-    existing = await db.favorites.find_one({"user_id": current_user.id, "box_id": box_id})
-    if existing:
-        raise HTTPException(status_code=400, detail="Box already in favorites")
-    
     favorite = Favorite(user_id=current_user.id, box_id=box_id)
-    await db.favorites.insert_one(favorite.dict())
+    try:
+        await db.favorites.insert_one(favorite.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Box already in favorites")
     return {"message": "Added to favorites"}
 
 @api_router.delete("/favorites/{box_id}")
@@ -302,38 +1716,149 @@ async def get_favorites(current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.CUSTOMER:
         raise HTTPException(status_code=403, detail="Only customers can access favorites")
     
-    favorites = await db.favorites.find({"user_id": current_user.id}, {"_id": 0}).to_list(100)
+    # favorites -> boxes -> restaurants in one pipeline; $unwind drops
+    # favorites whose box no longer exists.
+    pipeline = [
+        {"$match": {"user_id": current_user.id}},
+        {"$limit": 100},
+        {"$lookup": {
+            "from": "boxes",
+            "localField": "box_id",
+            "foreignField": "id",
+            "as": "box",
+        }},
+        {"$unwind": "$box"},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$box", {"favorite_id": "$id"}]}}},
+        *restaurant_lookup_stages(),
+    ]
+    return ORJSONResponse(await read_db.favorites.aggregate(pipeline).to_list(100))
+
+# Order Routes
+@api_router.post("/orders", response_model=Order)
+async def create_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.CUSTOMER:
+        raise HTTPException(status_code=403, detail="Only customers can place orders")
     
-    # Get box details for each favorite
-    result = []
-    for favorite in favorites:
-        box = await db.boxes.find_one({"id": favorite["box_id"]}, {"_id": 0})
-        if box:
-            restaurant = await db.restaurants.find_one({"id": box["restaurant_id"]}, {"_id": 0})
-            favorite_with_details = {
-                **box,
-                "restaurant_name": restaurant["name"] if restaurant else "Unknown",
-                "restaurant_address": restaurant["address"] if restaurant else "",
-                "favorite_id": favorite["id"]
-            }
-            result.append(favorite_with_details)
+    box = await reserve_box(order_data.box_id, order_data.quantity)
+    if box is None:
+        if not await db.boxes.find_one({"id": order_data.box_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Box not found")
+        raise HTTPException(status_code=409, detail="Not enough boxes available")
     
-    return result
+    order = Order(
+        user_id=current_user.id,
+        box_id=order_data.box_id,
+        quantity=order_data.quantity,
+        total_price=box["price_after"] * order_data.quantity
+    )
+    try:
+        # Denormalized so the analytics rollup never has to join orders to boxes
+        await db.orders.insert_one({
+            **order.dict(),
+            "restaurant_id": box["restaurant_id"],
+            "category": box["category"],
+            "customer_savings": (box["price_before"] - box["price_after"]) * order_data.quantity,
+        })
+    except PyMongoError:
+        # The stock is already taken; hand it back unless the insert did land
+        # before the error (e.g. a dropped connection after the write)
+        if not await db.orders.find_one({"user_id": current_user.id, "id": order.id}, {"_id": 1}):
+            released = await release_box(order_data.box_id, order_data.quantity)
+            feed_cache.bump()
+            if released:
+                publish_stock_change(released)
+        raise
+    feed_cache.bump()
+    publish_stock_change(box)
+    return order
+
+@api_router.get("/orders", response_model=List[Order])
+async def get_orders(current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.CUSTOMER:
+        raise HTTPException(status_code=403, detail="Only customers can access orders")
+    
+    orders = await db.orders.find(
+        {"user_id": current_user.id}, {"_id": 0}
+    ).sort("created_at", DESCENDING).to_list(100)
+    return [Order(**order) for order in orders]
 
 # Health check
 @api_router.get("/")
 async def root():
     return {"message": "Sät API is running", "status": "healthy"}
 
+@api_router.get("/ready")
+async def ready():
+    """Readiness probe: only succeeds once this worker can reach Mongo."""
+    if client is None:
+        raise HTTPException(status_code=503, detail="Database not connected")
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READINESS_TIMEOUT_SECONDS)
+    except (PyMongoError, asyncio.TimeoutError):
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Operational endpoints live outside /api, which nginx proxies to the public
+@app.get("/metrics/snapshot", include_in_schema=False)
+async def get_metrics():
+    return {
+        "password_hashing": password_executor.snapshot(),
+        "auth_ip_limiter": auth_ip_limiter.snapshot(),
+        "auth_email_limiter": auth_email_limiter.snapshot(),
+        "user_cache": user_cache.snapshot(),
+        "restaurant_cache": restaurant_cache.snapshot(),
+        "feed_cache": feed_cache.snapshot(),
+        "box_events": box_events.snapshot(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+for name, source in (
+    ("password_hashing", password_executor),
+    ("image_processing", image_executor),
+    ("auth_ip_limiter", auth_ip_limiter),
+    ("auth_email_limiter", auth_email_limiter),
+    ("user_cache", user_cache),
+    ("restaurant_cache", restaurant_cache),
+    ("feed_cache", feed_cache),
+    ("box_events", box_events),
+):
+    metrics.snapshots.register(name, source.snapshot)
+
+def route_template(request: Request) -> str:
+    """Label requests by route template, not raw path, to keep cardinality bounded."""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.observe_request(
+            request.method, route_template(request), status_code, time.perf_counter() - started
+        )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Configure logging
@@ -343,6 +1868,176 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# Indexes backing every query above. create_indexes is a no-op for indexes
+# that already exist with the same spec, so this is safe on every startup.
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "restaurants": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("location", "2dsphere")]),
+    ],
+    "boxes": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("is_available", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("restaurant_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("is_available", ASCENDING), ("pickup_end", ASCENDING)]),
+        # Date range scanned by the restaurant stats rollup
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel(
+            [("title", TEXT), ("description", TEXT), ("restaurant_name", TEXT)],
+            name="boxes_text",
+            default_language="russian",
+            weights={"title": 10, "restaurant_name": 5, "description": 1},
+        ),
+    ],
+    "favorites": [
+        IndexModel([("user_id", ASCENDING), ("box_id", ASCENDING)], unique=True),
+        IndexModel([("box_id", ASCENDING)]),
+    ],
+    "refresh_tokens": [
+        IndexModel([("token_hash", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("revoked_at", ASCENDING)]),
+        # TTL index: Mongo deletes tokens once they expire
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "restaurant_stats_daily": [
+        IndexModel([("restaurant_id", ASCENDING), ("day", DESCENDING)], unique=True),
+    ],
+    "media.files": [
+        IndexModel([("filename", ASCENDING), ("uploadDate", ASCENDING)]),
+    ],
+    "orders": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("box_id", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+}
+
+def connect_db():
+    global client, db, read_db, media
+    client = AsyncIOMotorClient(
+        mongo_url, event_listeners=metrics.mongo_listeners(), **MONGO_CLIENT_OPTIONS
+    )
+    db = client[os.environ['DB_NAME']]
+    read_preference = (
+        SecondaryPreferred(max_staleness=MONGO_READ_MAX_STALENESS_SECONDS)
+        if MONGO_READ_FROM_SECONDARIES else Primary()
+    )
+    read_db = client.get_database(os.environ['DB_NAME'], read_preference=read_preference)
+    media = AsyncIOMotorGridFSBucket(db, bucket_name="media")
+
+def duplicate_key_stages(fields: List[str]) -> List[dict]:
+    """Group a collection by ``fields`` and keep the keys held by more than one
+    document, with their _ids oldest first."""
+    return [
+        {"$sort": {"created_at": ASCENDING, "_id": ASCENDING}},
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+
+async def remove_duplicate_favorites() -> int:
+    """Keep the oldest of each repeated (user_id, box_id) favorite so the
+    unique index can be built over rows stored before it existed."""
+    removed = 0
+    async for group in db.favorites.aggregate(
+        duplicate_key_stages(["user_id", "box_id"]), allowDiskUse=True
+    ):
+        result = await db.favorites.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as exc:
+                if exc.code != 11000:
+                    raise
+                if collection == "favorites":
+                    removed = await remove_duplicate_favorites()
+                    logger.warning("Removed %d duplicate favorites", removed)
+                    await db[collection].create_indexes([index])
+                    continue
+                # Other duplicates (e.g. two accounts on one email) need a manual
+                # merge; start without the index rather than failing every worker
+                fields = list(index.document["key"])
+                duplicates = await db[collection].aggregate(
+                    [*duplicate_key_stages(fields), {"$limit": 10}], allowDiskUse=True
+                ).to_list(None)
+                logger.error(
+                    "Could not build unique index %s on %s; duplicate keys: %s",
+                    index.document["name"], collection, [group["_id"] for group in duplicates],
+                )
+    logger.info("Ensured indexes on %s", ", ".join(INDEXES))
+
+async def backfill_box_restaurant_names():
+    """Denormalize restaurant_name onto boxes created before search indexed it."""
+    async for restaurant in db.restaurants.find({}, {"_id": 0, "id": 1, "name": 1}):
+        await db.boxes.update_many(
+            {"restaurant_id": restaurant["id"], "restaurant_name": {"$exists": False}},
+            {"$set": {"restaurant_name": restaurant["name"]}},
+        )
+
+async def backfill_box_pickup_windows():
+    """Give boxes created before pickup windows existed the window their
+    pickup_time named on the day they were posted, so the sweeper retires them."""
+    requests = []
+    async for box in db.boxes.find(
+        {"pickup_end": {"$exists": False}}, {"_id": 0, "id": 1, "pickup_time": 1, "created_at": 1}
+    ):
+        posted = box["created_at"].replace(tzinfo=timezone.utc)
+        pickup_start, pickup_end = parse_pickup_window(box.get("pickup_time"), now=posted)
+        requests.append(UpdateOne(
+            {"id": box["id"]}, {"$set": {"pickup_start": pickup_start, "pickup_end": pickup_end}}
+        ))
+        if len(requests) >= BULK_INSERT_BATCH_SIZE:
+            await db.boxes.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        await db.boxes.bulk_write(requests, ordered=False)
+
+async def backfill_restaurant_stats():
+    """Roll up every day on record; the periodic job only revisits recent days.
+
+    Boxes whose pickup window has ended are retired first so that older days
+    count them as expired.
+    """
+    await expire_boxes()
+    await refresh_restaurant_stats(full_history=True)
+
+# One-time data migrations, applied in order; each is recorded in the
+# migrations collection once done and must be safe to run twice
+MIGRATIONS = {
+    "box_restaurant_names": backfill_box_restaurant_names,
+    "box_pickup_windows": backfill_box_pickup_windows,
+    "restaurant_stats_history": backfill_restaurant_stats,
+}
+
+async def run_migrations():
+    for name, migrate in MIGRATIONS.items():
+        if await db.migrations.find_one({"_id": name}, {"_id": 1}):
+            continue
+        await migrate()
+        await db.migrations.update_one(
+            {"_id": name}, {"$set": {"applied_at": datetime.utcnow()}}, upsert=True
+        )
+        logger.info("Applied migration %s", name)
+
+background_tasks = set()
+
+def start_background_tasks():
+    background_tasks.add(asyncio.create_task(sweep_expired_boxes()))
+    background_tasks.add(asyncio.create_task(refresh_stats_periodically()))
+    background_tasks.add(asyncio.create_task(metrics.monitor_event_loop_lag()))
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await release_leases()
@@ -0,0 +1,135 @@
+"""Benchmark for the GET /api/boxes feed query.
+
+Seeds a throwaway database with restaurants and boxes, then compares the old
+per-box ``restaurants.find_one`` loop with the single aggregation used by
+``get_boxes``, reporting Mongo round trips and latency for each.
+
+Usage:
+    python benchmarks/feed_benchmark.py --boxes 100 --restaurants 20 --runs 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from server import restaurant_lookup_stages  # noqa: E402
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ("ping", "endSessions"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, n_restaurants: int, n_boxes: int):
+    await db.restaurants.delete_many({})
+    await db.boxes.delete_many({})
+    restaurants = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "name": f"Ресторан {i}",
+            "description": "Benchmark restaurant",
+            "address": f"Алматы, ул. Абая {i}",
+            "created_at": datetime.utcnow(),
+        }
+        for i in range(n_restaurants)
+    ]
+    await db.restaurants.insert_many(restaurants)
+    boxes = [
+        {
+            "id": str(uuid.uuid4()),
+            "restaurant_id": restaurants[i % n_restaurants]["id"],
+            "title": f"Бокс {i}",
+            "description": "Benchmark box",
+            "category": "Выпечка",
+            "quantity": 5,
+            "price_before": 3000.0,
+            "price_after": 1000.0,
+            "pickup_time": "18:00-20:00",
+            "created_at": datetime.utcnow(),
+            "is_available": True,
+        }
+        for i in range(n_boxes)
+    ]
+    await db.boxes.insert_many(boxes)
+
+
+async def feed_n_plus_one(db):
+    boxes = await db.boxes.find({"is_available": True}, {"_id": 0}).to_list(100)
+    result = []
+    for box in boxes:
+        restaurant = await db.restaurants.find_one({"id": box["restaurant_id"]}, {"_id": 0})
+        result.append({
+            **box,
+            "restaurant_name": restaurant["name"] if restaurant else "Unknown",
+            "restaurant_address": restaurant["address"] if restaurant else "",
+        })
+    return result
+
+
+async def feed_aggregate(db):
+    pipeline = [
+        {"$match": {"is_available": True}},
+        {"$limit": 100},
+        *restaurant_lookup_stages(),
+    ]
+    return await db.boxes.aggregate(pipeline).to_list(100)
+
+
+async def measure(name, fn, db, counter, runs):
+    await fn(db)  # warm up
+    timings = []
+    counter.count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await fn(db)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(
+        f"{name:<12} rows={len(result):<4} round_trips={counter.count / runs:<6.1f} "
+        f"p50={statistics.median(timings):.2f}ms "
+        f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=100)
+    parser.add_argument("--restaurants", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "sat_benchmark"))
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], event_listeners=[counter])
+    db = client[args.db]
+    try:
+        await seed(db, args.restaurants, args.boxes)
+        await measure("n_plus_one", feed_n_plus_one, db, counter, args.runs)
+        await measure("aggregate", feed_aggregate, db, counter, args.runs)
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+"""Concurrent load test for the real ``server:app`` against a seeded local mongod.
+
+Seeds the benchmark database (see ``seed.py``), starts uvicorn on it, then
+drives each endpoint scenario with a fixed number of requests at a fixed
+concurrency and reports throughput and p50/p95/p99 latency. Results can be
+saved and compared with a baseline; a regression beyond the tolerance makes
+the run exit non-zero.
+
+Usage:
+    python benchmarks/load_test.py --requests 500 --concurrency 50 --save bench.json
+    python benchmarks/load_test.py --compare bench.json --tolerance 0.2
+    python benchmarks/load_test.py --base-url http://localhost:8001 --no-seed
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from seed import SEED_PASSWORD, add_seed_arguments, customer_email, restaurant_email, seed
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+TOKEN_POOL_SIZE = 20
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Session:
+    """Tokens for seeded accounts, logged in once before measuring."""
+
+    def __init__(self, customers, restaurants):
+        self.customers = customers
+        self.restaurants = restaurants
+
+    @classmethod
+    async def login(cls, http: httpx.AsyncClient, n_customers: int, n_restaurants: int):
+        async def token(email):
+            response = await http.post("/api/auth/login", json={"email": email, "password": SEED_PASSWORD})
+            response.raise_for_status()
+            return response.json()["access_token"]
+
+        customers = await asyncio.gather(
+            *(token(customer_email(n)) for n in range(min(n_customers, TOKEN_POOL_SIZE)))
+        )
+        restaurants = await asyncio.gather(
+            *(token(restaurant_email(n)) for n in range(min(n_restaurants, TOKEN_POOL_SIZE)))
+        )
+        return cls(customers, restaurants)
+
+    def customer(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.customers[i % len(self.customers)]}"}
+
+    def restaurant(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.restaurants[i % len(self.restaurants)]}"}
+
+
+async def create_hot_box(http: httpx.AsyncClient, session: Session, quantity: int) -> str:
+    """Post the single box every ``orders`` request competes for, stocked so
+    the scenario measures contended reservations rather than sold-out 409s."""
+    response = await http.post("/api/boxes", headers=session.restaurant(0), json={
+        "title": "Горячий бокс",
+        "description": "Ordered concurrently by the load test",
+        "category": "Выпечка",
+        "quantity": quantity,
+        "price_before": 3000,
+        "price_after": 1000,
+        "pickup_time": "00:00-23:59",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def build_scenarios(session: Session, n_customers: int, hot_box_id: str):
+    new_box = {
+        "title": "Нагрузочный бокс",
+        "description": "Created by the load test",
+        "category": "Десерты",
+        "quantity": 3,
+        "price_before": 4000,
+        "price_after": 1500,
+        "pickup_time": "20:00-22:00",
+    }
+    return {
+        "login": lambda http, i: http.post(
+            "/api/auth/login",
+            json={"email": customer_email(i % n_customers), "password": SEED_PASSWORD},
+        ),
+        "boxes": lambda http, i: http.get("/api/boxes", headers=session.customer(i)),
+        "favorites": lambda http, i: http.get("/api/favorites", headers=session.customer(i)),
+        "boxes_my": lambda http, i: http.get("/api/boxes/my", headers=session.restaurant(i)),
+        "create_box": lambda http, i: http.post("/api/boxes", json=new_box, headers=session.restaurant(i)),
+        "orders": lambda http, i: http.post(
+            "/api/orders", json={"box_id": hot_box_id, "quantity": 1}, headers=session.customer(i)
+        ),
+    }
+
+
+async def run_scenario(http: httpx.AsyncClient, call, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await call(http, i)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0.0,
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for name, base in baseline["results"].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f}ms vs baseline {base['p95_ms']:.1f}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput_rps']:.1f} rps "
+                f"vs baseline {base['throughput_rps']:.1f} rps"
+            )
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']:.1%} vs baseline {base['error_rate']:.1%}")
+    return regressions
+
+
+async def wait_until_up(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        while time.monotonic() < deadline:
+            try:
+                if (await http.get("/api/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout:.0f}s")
+
+
+def start_server(db_name: str, port: int) -> subprocess.Popen:
+    # Every simulated user logs in from one address, so auth limits would
+    # measure the limiter rather than the endpoint
+    env = {**os.environ, "DB_NAME": db_name, "AUTH_RATE_LIMIT_ENABLED": "false"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "sat_benchmark"))
+    parser.add_argument("--base-url", help="target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        mongo = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        try:
+            await seed(mongo[args.db], args.customers, args.restaurants, args.boxes, args.favorites)
+        finally:
+            mongo.close()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args.db, args.port)
+    try:
+        await wait_until_up(base_url)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+            session = await Session.login(http, args.customers, args.restaurants)
+            hot_box_id = await create_hot_box(http, session, args.requests)
+            scenarios = build_scenarios(session, args.customers, hot_box_id)
+            selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+            results = {}
+            print(f"{'scenario':<12} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+            for name in selected:
+                stats = await run_scenario(http, scenarios[name], args.requests, args.concurrency)
+                results[name] = stats
+                print(
+                    f"{name:<12} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>7.1f}ms "
+                    f"{stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms {stats['errors']:>7}"
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.save:
+        report = {
+            "meta": {
+                "timestamp": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "dataset": {
+                    "customers": args.customers,
+                    "restaurants": args.restaurants,
+                    "boxes": args.boxes,
+                    "favorites": args.favorites,
+                },
+            },
+            "results": results,
+        }
+        Path(args.save).write_text(json.dumps(report, indent=2))
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Seed a local mongod with benchmark users, restaurants, boxes and favorites.
+
+Every seeded account shares the password ``SEED_PASSWORD``; emails follow
+``customer_<n>@bench.local`` and ``restaurant_<n>@bench.local`` so the load
+test can log in as any of them.
+
+Usage:
+    python benchmarks/seed.py --db sat_benchmark --customers 200 --restaurants 50 \\
+        --boxes 2000 --favorites 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import bcrypt
+from motor.motor_asyncio import AsyncIOMotorClient
+
+SEED_PASSWORD = "benchpass123"
+CATEGORIES = ["Выпечка", "Десерты", "Салаты", "Горячие блюда"]
+BATCH_SIZE = 1000
+
+
+def customer_email(n: int) -> str:
+    return f"customer_{n}@bench.local"
+
+
+def restaurant_email(n: int) -> str:
+    return f"restaurant_{n}@bench.local"
+
+
+def _user(name: str, email: str, role: str, password_hash: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "email": email,
+        "role": role,
+        "created_at": datetime.utcnow(),
+        "password": password_hash,
+    }
+
+
+async def _insert(collection, docs):
+    for start in range(0, len(docs), BATCH_SIZE):
+        await collection.insert_many(docs[start:start + BATCH_SIZE], ordered=False)
+
+
+async def seed(db, customers: int, restaurants: int, boxes: int, favorites: int, rng=None) -> dict:
+    """Replace the contents of ``db`` with a generated dataset; returns the counts."""
+    rng = rng or random.Random(42)
+    # One hash for everyone keeps seeding fast; bcrypt cost is paid at login.
+    password_hash = bcrypt.hashpw(SEED_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    for name in ("users", "restaurants", "boxes", "favorites", "orders"):
+        await db[name].delete_many({})
+
+    customer_docs = [
+        _user(f"Покупатель {n}", customer_email(n), "customer", password_hash)
+        for n in range(customers)
+    ]
+    owner_docs = [
+        _user(f"Ресторан {n}", restaurant_email(n), "restaurant", password_hash)
+        for n in range(restaurants)
+    ]
+    await _insert(db.users, customer_docs + owner_docs)
+
+    restaurant_docs = []
+    for n, owner in enumerate(owner_docs):
+        lat = 43.24 + rng.uniform(-0.08, 0.08)
+        lng = 76.91 + rng.uniform(-0.12, 0.12)
+        restaurant_docs.append({
+            "id": str(uuid.uuid4()),
+            "user_id": owner["id"],
+            "name": f"Ресторан {n}",
+            "description": "Seeded benchmark restaurant",
+            "address": f"Алматы, ул. Абая {n}",
+            "logo": None,
+            "phone": None,
+            "latitude": lat,
+            "longitude": lng,
+            "location": {"type": "Point", "coordinates": [lng, lat]},
+            "created_at": datetime.utcnow(),
+        })
+    await _insert(db.restaurants, restaurant_docs)
+
+    now = datetime.utcnow()
+    box_docs = []
+    for n in range(boxes):
+        restaurant = restaurant_docs[n % len(restaurant_docs)]
+        price_before = float(rng.randrange(1500, 8000, 500))
+        box_docs.append({
+            "id": str(uuid.uuid4()),
+            "restaurant_id": restaurant["id"],
+            "restaurant_name": restaurant["name"],
+            "title": f"Сюрприз-бокс {n}",
+            "description": "Свежая выпечка, салаты и горячие блюда со скидкой",
+            "category": CATEGORIES[n % len(CATEGORIES)],
+            "quantity": rng.randint(1, 10),
+            "price_before": price_before,
+            "price_after": round(price_before * rng.uniform(0.3, 0.6)),
+            "pickup_time": "18:00-20:00",
+            "pickup_start": now + timedelta(hours=1),
+            "pickup_end": now + timedelta(hours=3),
+            "created_at": now - timedelta(seconds=n),
+            "is_available": True,
+        })
+    await _insert(db.boxes, box_docs)
+
+    favorite_docs = []
+    for customer in customer_docs:
+        for box in rng.sample(box_docs, min(favorites, len(box_docs))):
+            favorite_docs.append({
+                "id": str(uuid.uuid4()),
+                "user_id": customer["id"],
+                "box_id": box["id"],
+                "created_at": now,
+            })
+    if favorite_docs:
+        await _insert(db.favorites, favorite_docs)
+
+    return {
+        "customers": len(customer_docs),
+        "restaurants": len(restaurant_docs),
+        "boxes": len(box_docs),
+        "favorites": len(favorite_docs),
+    }
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--restaurants", type=int, default=50)
+    parser.add_argument("--boxes", type=int, default=2000)
+    parser.add_argument("--favorites", type=int, default=10, help="favorites per customer")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "sat_benchmark"))
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        counts = await seed(client[args.db], args.customers, args.restaurants, args.boxes, args.favorites)
+    finally:
+        client.close()
+    print(f"Seeded {args.db}: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
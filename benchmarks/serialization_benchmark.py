@@ -0,0 +1,86 @@
+"""Micro-benchmark for encoding box lists, the dominant cost of large list responses.
+
+Compares FastAPI's default path (pydantic validation via ``Box(**doc)`` plus
+``jsonable_encoder`` and ``json.dumps``) with the orjson path used for trusted
+database reads. Needs no database.
+
+Usage:
+    python benchmarks/serialization_benchmark.py --boxes 1000 --runs 200
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from server import Box  # noqa: E402
+
+
+def make_boxes(n: int):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "restaurant_id": str(uuid.uuid4()),
+            "title": f"Бокс {i}",
+            "description": "Свежая выпечка и десерты за полцены",
+            "category": "Выпечка",
+            "quantity": 5,
+            "price_before": 3000.0,
+            "price_after": 1000.0,
+            "pickup_time": "18:00-20:00",
+            "created_at": datetime.utcnow(),
+            "is_available": True,
+            "restaurant_name": "Ресторан",
+            "restaurant_address": "Алматы, ул. Абая 1",
+        }
+        for i in range(n)
+    ]
+
+
+def validated_json(docs):
+    return json.dumps(jsonable_encoder([Box(**doc) for doc in docs])).encode("utf-8")
+
+
+def encoded_json(docs):
+    return json.dumps(jsonable_encoder(docs)).encode("utf-8")
+
+
+def fast_json(docs):
+    return orjson.dumps(docs)
+
+
+def measure(name, fn, docs, runs, per):
+    fn(docs)  # warm up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - start)
+    scale = per / len(docs) * 1000
+    print(
+        f"{name:<18} median={statistics.median(timings) * scale:8.3f}ms "
+        f"min={min(timings) * scale:8.3f}ms per {per} boxes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = make_boxes(args.boxes)
+    measure("validate+encode", validated_json, docs, args.runs, 1000)
+    measure("jsonable_encoder", encoded_json, docs, args.runs, 1000)
+    measure("orjson", fast_json, docs, args.runs, 1000)
+
+
+if __name__ == "__main__":
+    main()
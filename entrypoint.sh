@@ -1,28 +1,62 @@
 #!/bin/sh
 set -e
 
+# Number of Uvicorn worker processes. Defaults to one: the live box stream,
+# feed cache invalidation and auth rate limits are kept in process memory, so
+# extra workers miss each other's events and multiply the configured limits.
+WORKERS="${WEB_CONCURRENCY:-1}"
+# Seconds a stopping worker may spend draining in-flight requests
+GRACEFUL_TIMEOUT="${GRACEFUL_TIMEOUT:-20}"
+# Seconds to wait for the backend to report ready before giving up
+READY_TIMEOUT="${READY_TIMEOUT:-60}"
+
+# With several workers, Prometheus samples are merged through files in a shared
+# directory; start it empty so counters from a previous run are not reported
+if [ "$WORKERS" -gt 1 ]; then
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-multiproc}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
+echo "Starting FastAPI backend with $WORKERS workers"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+uvicorn server:app --host 0.0.0.0 --port 8001 \
+    --workers "$WORKERS" \
+    --timeout-graceful-shutdown "$GRACEFUL_TIMEOUT" &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend to become ready..."
+elapsed=0
+until wget -q -O /dev/null http://127.0.0.1:8001/api/ready 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$elapsed" -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 1
+    elapsed=$((elapsed + 1))
+done
+echo "Backend is ready after ${elapsed}s"
 
 # Start Nginx
 nginx -g 'daemon off;' &
 NGINX_PID=$!
 
-# Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+# On termination let nginx finish open requests and Uvicorn drain its workers
+shutdown() {
+    nginx -s quit 2>/dev/null || kill $NGINX_PID
+    kill -TERM $BACKEND_PID
+    wait $BACKEND_PID
+    exit 0
+}
+trap shutdown TERM INT
 
 # Check if processes are still running
 while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, createContext, useContext } from 'react';
+import React, { useState, useEffect, useRef, createContext, useContext } from 'react';
 import { BrowserRouter, Routes, Route, Navigate, useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import './App.css';
@@ -17,6 +17,10 @@ const useAuth = () => {
   return context;
 };
 
+// Shared so that concurrent 401s trigger a single refresh; a refresh token
+// can only be used once
+let refreshPromise = null;
+
 // Auth Provider Component
 const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
@@ -32,6 +36,65 @@ const AuthProvider = ({ children }) => {
     }
   }, [token]);
 
+  // Renew an expired access token with the refresh token and retry once
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      response => response,
+      async (error) => {
+        const original = error.config;
+        if (error.response?.status !== 401 || !original || original._retried
+            || !localStorage.getItem('refreshToken') || original.url === `${API}/auth/refresh`) {
+          return Promise.reject(error);
+        }
+        original._retried = true;
+        // Tabs share the stored session: if another tab has refreshed since
+        // this request was sent, retry with its access token instead of
+        // presenting a refresh token that was just rotated
+        const storedToken = localStorage.getItem('token');
+        if (storedToken && original.headers['Authorization'] !== `Bearer ${storedToken}`) {
+          axios.defaults.headers.common['Authorization'] = `Bearer ${storedToken}`;
+          original.headers['Authorization'] = `Bearer ${storedToken}`;
+          return axios(original);
+        }
+        const refreshToken = localStorage.getItem('refreshToken');
+        try {
+          if (!refreshPromise) {
+            refreshPromise = axios
+              .post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+              .then(response => {
+                storeSession(response.data);
+                return response.data.access_token;
+              })
+              .finally(() => { refreshPromise = null; });
+          }
+          const accessToken = await refreshPromise;
+          original.headers['Authorization'] = `Bearer ${accessToken}`;
+          return axios(original);
+        } catch (refreshError) {
+          // Another tab stored a new session meanwhile; use it rather than
+          // logging out, which would revoke that tab's refresh token
+          if (localStorage.getItem('refreshToken') !== refreshToken && localStorage.getItem('token')) {
+            original.headers['Authorization'] = `Bearer ${localStorage.getItem('token')}`;
+            return axios(original);
+          }
+          logout();
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
+  const storeSession = ({ access_token, refresh_token, user: userData }) => {
+    localStorage.setItem('token', access_token);
+    if (refresh_token) {
+      localStorage.setItem('refreshToken', refresh_token);
+    }
+    axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+    setToken(access_token);
+    setUser(userData);
+  };
+
   const fetchUser = async () => {
     try {
       const response = await axios.get(`${API}/auth/me`);
@@ -46,14 +109,9 @@ const AuthProvider = ({ children }) => {
   const login = async (email, password) => {
     try {
       const response = await axios.post(`${API}/auth/login`, { email, password });
-      const { access_token, user: userData } = response.data;
+      storeSession(response.data);
       
-      localStorage.setItem('token', access_token);
-      setToken(access_token);
-      setUser(userData);
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
-      
-      return userData;
+      return response.data.user;
     } catch (error) {
       throw new Error(error.response?.data?.detail || 'Login failed');
     }
@@ -62,20 +120,20 @@ const AuthProvider = ({ children }) => {
   const register = async (name, email, password, role) => {
     try {
       const response = await axios.post(`${API}/auth/register`, { name, email, password, role });
-      const { access_token, user: userData } = response.data;
-      
-      localStorage.setItem('token', access_token);
-      setToken(access_token);
-      setUser(userData);
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      storeSession(response.data);
       
-      return userData;
+      return response.data.user;
     } catch (error) {
       throw new Error(error.response?.data?.detail || 'Registration failed');
     }
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('token');
     setToken(null);
     setUser(null);
@@ -487,7 +545,18 @@ const FoodBoxCard = ({ box, onFavorite, isFavorited }) => {
     <div className="bg-white rounded-xl shadow-md overflow-hidden">
       <div className="relative">
         <div className="h-32 bg-gradient-to-br from-orange-100 to-orange-200 flex items-center justify-center">
-          <span className="text-4xl">🍕</span>
+          {box.restaurant_logo ? (
+            <img
+              src={`${BACKEND_URL}${box.restaurant_logo}`}
+              alt={box.restaurant_name}
+              width={64}
+              height={64}
+              loading="lazy"
+              className="w-16 h-16 rounded-full"
+            />
+          ) : (
+            <span className="text-4xl">🍕</span>
+          )}
         </div>
         <button
           onClick={() => onFavorite(box.id)}
@@ -524,7 +593,7 @@ const CustomerHome = () => {
   const [favorites, setFavorites] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedCategory, setSelectedCategory] = useState('all');
-  const { user } = useAuth();
+  const { user, token } = useAuth();
 
   const categories = [
     { id: 'all', name: 'Все', emoji: '🍽️' },
@@ -534,15 +603,47 @@ const CustomerHome = () => {
     { id: 'Горячие блюда', name: 'Горячие блюда', emoji: '🍲' }
   ];
 
+  // Favorite toggles not yet sent; flushed together through /favorites/batch
+  const pendingFavorites = useRef({});
+  const flushTimer = useRef(null);
+
   useEffect(() => {
     fetchBoxes();
-    fetchFavorites();
+    return () => {
+      clearTimeout(flushTimer.current);
+      flushFavorites();
+    };
   }, []);
 
+  // Apply live box changes instead of refetching the whole feed
+  useEffect(() => {
+    if (!token) return;
+    const source = new EventSource(`${API}/boxes/stream?token=${encodeURIComponent(token)}`);
+
+    source.addEventListener('box.created', (event) => {
+      const { box } = JSON.parse(event.data);
+      setBoxes(prev => [box, ...prev.filter(b => b.id !== box.id)]);
+    });
+    source.addEventListener('box.updated', (event) => {
+      const { box_id, quantity } = JSON.parse(event.data);
+      setBoxes(prev => prev.map(b => (b.id === box_id ? { ...b, quantity } : b)));
+    });
+    const removeBox = (event) => {
+      const { box_id } = JSON.parse(event.data);
+      setBoxes(prev => prev.filter(b => b.id !== box_id));
+    };
+    source.addEventListener('box.sold_out', removeBox);
+    source.addEventListener('box.expired', removeBox);
+    source.addEventListener('resync', () => fetchBoxes());
+
+    return () => source.close();
+  }, [token]);
+
   const fetchBoxes = async () => {
     try {
-      const response = await axios.get(`${API}/boxes`);
+      const response = await axios.get(`${API}/boxes`, { params: { include_favorites: true } });
       setBoxes(response.data);
+      setFavorites(response.data.filter(box => box.is_favorite).map(box => box.id));
     } catch (error) {
       console.error('Error fetching boxes:', error);
     } finally {
@@ -550,27 +651,26 @@ const CustomerHome = () => {
     }
   };
 
-  const fetchFavorites = async () => {
+  const flushFavorites = async () => {
+    const pending = pendingFavorites.current;
+    pendingFavorites.current = {};
+    const add = Object.keys(pending).filter(id => pending[id]);
+    const remove = Object.keys(pending).filter(id => !pending[id]);
+    if (add.length === 0 && remove.length === 0) return;
     try {
-      const response = await axios.get(`${API}/favorites`);
-      setFavorites(response.data.map(fav => fav.box_id || fav.id));
+      await axios.post(`${API}/favorites/batch`, { add, remove });
     } catch (error) {
-      console.error('Error fetching favorites:', error);
+      console.error('Error updating favorites:', error);
+      fetchBoxes();
     }
   };
 
-  const handleFavorite = async (boxId) => {
-    try {
-      if (favorites.includes(boxId)) {
-        await axios.delete(`${API}/favorites/${boxId}`);
-        setFavorites(favorites.filter(id => id !== boxId));
-      } else {
-        await axios.post(`${API}/favorites/${boxId}`);
-        setFavorites([...favorites, boxId]);
-      }
-    } catch (error) {
-      console.error('Error updating favorite:', error);
-    }
+  const handleFavorite = (boxId) => {
+    const isFavorite = !favorites.includes(boxId);
+    setFavorites(isFavorite ? [...favorites, boxId] : favorites.filter(id => id !== boxId));
+    pendingFavorites.current[boxId] = isFavorite;
+    clearTimeout(flushTimer.current);
+    flushTimer.current = setTimeout(flushFavorites, 500);
   };
 
   const filteredBoxes = selectedCategory === 'all' 
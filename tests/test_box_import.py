@@ -0,0 +1,50 @@
+"""CSV box import when the upload breaks partway through.
+
+Runs against an in-memory stand-in for the boxes collection, since only
+insert_many is involved; no MongoDB is needed.
+"""
+import asyncio
+import io
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import server  # noqa: E402
+
+HEADER = "title,description,category,quantity,price_before,price_after,pickup_time\n"
+ROW = "Вечерний бокс,Выпечка дня,Выпечка,3,3000,1000,18:00-20:00\n"
+RESTAURANT = {"id": "restaurant-1", "name": "Наан", "address": "Абая 1"}
+
+
+class Boxes:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+def test_undecodable_row_keeps_earlier_rows(monkeypatch):
+    boxes = Boxes()
+    monkeypatch.setattr(server, "db", types.SimpleNamespace(boxes=boxes))
+
+    async def owner(user):
+        return RESTAURANT
+
+    monkeypatch.setattr(server, "get_box_owner", owner)
+    good_rows = server.BULK_INSERT_BATCH_SIZE + 50
+    upload = types.SimpleNamespace(
+        file=io.BytesIO((HEADER + ROW * good_rows).encode() + b"\xff\xfe broken\n" + ROW.encode())
+    )
+    version = server.feed_cache.version
+    published = server.box_events.published
+
+    result = asyncio.run(server.import_boxes_csv(upload, None))
+
+    assert result["created"] == good_rows
+    assert len(boxes.docs) == good_rows
+    assert [error["row"] for error in result["errors"]] == [good_rows + 1]
+    assert result["errors"][0]["errors"][0]["message"].startswith("Invalid CSV file")
+    assert server.feed_cache.version > version
+    assert server.box_events.published - published == good_rows
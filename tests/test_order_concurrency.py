@@ -0,0 +1,129 @@
+"""Concurrency checks for box reservation against a real mongod.
+
+Fires many parallel orders at a single box, both at reserve_box and through
+POST /api/orders, and verifies stock is never oversold. Requires MONGO_URL to
+point at a reachable server; skipped otherwise.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import server  # noqa: E402
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+STOCK = 50
+CUSTOMERS = 500
+
+
+@pytest.fixture
+def run_in_test_db(monkeypatch):
+    """Run an async scenario with ``server.db`` pointed at a throwaway database.
+
+    Each call gets a fresh client on the scenario's event loop; the database
+    is dropped afterwards. Skips the test when MongoDB is not reachable.
+    """
+    def run(scenario):
+        async def wrapper():
+            client = AsyncIOMotorClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=2000)
+            try:
+                await client.admin.command("ping")
+            except Exception:
+                client.close()
+                pytest.skip("MongoDB is not reachable")
+            db_name = f"sat_test_{uuid.uuid4().hex[:8]}"
+            monkeypatch.setattr(server, "db", client[db_name])
+            try:
+                return await scenario()
+            finally:
+                await client.drop_database(db_name)
+                client.close()
+
+        return asyncio.run(wrapper())
+
+    return run
+
+
+def _box(quantity: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "restaurant_id": str(uuid.uuid4()),
+        "title": "Вечерний бокс",
+        "description": "Concurrency test box",
+        "category": "Выпечка",
+        "quantity": quantity,
+        "price_before": 3000.0,
+        "price_after": 1000.0,
+        "pickup_time": "18:00-20:00",
+        "created_at": datetime.utcnow(),
+        "is_available": True,
+    }
+
+
+def test_parallel_orders_never_oversell(run_in_test_db):
+    async def scenario():
+        box = _box(STOCK)
+        await server.db.boxes.insert_one(box)
+        results = await asyncio.gather(
+            *(server.reserve_box(box["id"], 1) for _ in range(CUSTOMERS))
+        )
+        stored = await server.db.boxes.find_one({"id": box["id"]})
+        return results, stored
+
+    results, stored = run_in_test_db(scenario)
+
+    successes = [r for r in results if r is not None]
+    assert len(successes) == STOCK
+    assert stored["quantity"] == 0
+    assert stored["is_available"] is False
+    # Every successful reservation saw a distinct remaining quantity.
+    assert sorted(r["quantity"] for r in successes) == list(range(STOCK))
+
+
+def test_parallel_order_requests_record_one_order_per_success(run_in_test_db, monkeypatch):
+    customer = server.User(name="Покупатель", email="customer@example.com", role=server.UserRole.CUSTOMER)
+    monkeypatch.setitem(server.app.dependency_overrides, server.get_current_user, lambda: customer)
+
+    async def scenario():
+        box = _box(STOCK)
+        await server.db.boxes.insert_one(box)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            responses = await asyncio.gather(*(
+                http.post("/api/orders", json={"box_id": box["id"], "quantity": 1})
+                for _ in range(CUSTOMERS)
+            ))
+        orders = await server.db.orders.count_documents({"box_id": box["id"]})
+        stored = await server.db.boxes.find_one({"id": box["id"]})
+        return [response.status_code for response in responses], orders, stored
+
+    statuses, orders, stored = run_in_test_db(scenario)
+
+    assert statuses.count(200) == STOCK
+    assert statuses.count(409) == CUSTOMERS - STOCK
+    assert orders == STOCK
+    assert stored["quantity"] == 0
+
+
+def test_multi_unit_order_rejected_when_short(run_in_test_db):
+    async def scenario():
+        box = _box(3)
+        await server.db.boxes.insert_one(box)
+        first = await server.reserve_box(box["id"], 2)
+        second = await server.reserve_box(box["id"], 2)
+        stored = await server.db.boxes.find_one({"id": box["id"]})
+        return first, second, stored
+
+    first, second, stored = run_in_test_db(scenario)
+
+    assert first["quantity"] == 1
+    assert first["is_available"] is True
+    assert second is None
+    assert stored["quantity"] == 1
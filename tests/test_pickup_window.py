@@ -0,0 +1,50 @@
+"""Unit checks for turning pickup_time strings into pickup windows."""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import server  # noqa: E402
+
+
+def local(day: int, hour: int, minute: int = 0) -> datetime:
+    return datetime(2026, 3, day, hour, minute, tzinfo=server.PICKUP_TIMEZONE)
+
+
+def window(day: int, start_hour: int, end_day: int, end_hour: int) -> tuple:
+    return server.to_naive_utc(local(day, start_hour)), server.to_naive_utc(local(end_day, end_hour))
+
+
+def test_window_later_today():
+    assert server.parse_pickup_window("18:00-20:00", now=local(10, 12)) == window(10, 18, 10, 20)
+
+
+def test_window_in_progress():
+    assert server.parse_pickup_window("18:00-20:00", now=local(10, 19)) == window(10, 18, 10, 20)
+
+
+def test_window_already_over_moves_to_tomorrow():
+    assert server.parse_pickup_window("18:00-20:00", now=local(10, 21)) == window(11, 18, 11, 20)
+
+
+def test_cross_midnight_window_posted_in_the_evening():
+    assert server.parse_pickup_window("22:00-01:00", now=local(10, 15)) == window(10, 22, 11, 1)
+
+
+def test_cross_midnight_window_still_running_after_midnight():
+    assert server.parse_pickup_window("22:00-01:00", now=local(11, 0, 30)) == window(10, 22, 11, 1)
+
+
+def test_cross_midnight_window_over_moves_to_tonight():
+    assert server.parse_pickup_window("22:00-01:00", now=local(11, 2)) == window(11, 22, 12, 1)
+
+
+def test_accepts_dots_and_dashes():
+    assert server.parse_pickup_window("9.30 – 11.00", now=local(10, 8)) == (
+        server.to_naive_utc(local(10, 9, 30)), server.to_naive_utc(local(10, 11))
+    )
+
+
+def test_unparseable_strings_never_expire():
+    assert server.parse_pickup_window("после обеда", now=local(10, 12)) == (None, None)
+    assert server.parse_pickup_window("25:00-26:00", now=local(10, 12)) == (None, None)
@@ -0,0 +1,84 @@
+"""Checks that read-mostly queries are routed to secondaries and writes are not.
+
+Routing is only observable on a replica set, e.g. a local one started with
+``mongod --replSet rs0`` plus two more members and ``rs.initiate()``; point
+MONGO_URL at it (with ``?replicaSet=rs0``). Skipped when Mongo is unreachable
+or not a replica set with a secondary.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo import monitoring
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import metrics  # noqa: E402
+import server  # noqa: E402
+
+
+class FindRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.addresses = []
+
+    def started(self, event):
+        if event.command_name == "find":
+            host, port = event.connection_id
+            self.addresses.append(f"{host}:{port}")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def restore_connection(monkeypatch):
+    # connect_db() rebinds these module globals; record them so monkeypatch
+    # puts the originals back instead of leaking a closed client
+    for name in ("client", "db", "read_db", "media"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+
+
+def test_read_db_uses_bounded_staleness_secondary_preferred(monkeypatch):
+    monkeypatch.setattr(server, "MONGO_READ_FROM_SECONDARIES", True)
+
+    async def scenario():
+        server.connect_db()
+        try:
+            preference = server.read_db.read_preference
+            assert isinstance(preference, SecondaryPreferred)
+            assert preference.max_staleness == server.MONGO_READ_MAX_STALENESS_SECONDS
+            assert server.db.read_preference == Primary()
+        finally:
+            server.client.close()
+
+    asyncio.run(scenario())
+
+
+def test_reads_hit_secondary_and_writes_hit_primary(monkeypatch):
+    recorder = FindRecorder()
+    monkeypatch.setattr(server, "MONGO_READ_FROM_SECONDARIES", True)
+    monkeypatch.setattr(metrics, "mongo_listeners", lambda: [recorder])
+
+    async def scenario():
+        server.connect_db()
+        try:
+            try:
+                hello = await server.client.admin.command("hello")
+            except Exception:
+                pytest.skip("MongoDB is not reachable")
+            if "setName" not in hello or not hello.get("hosts") or len(hello["hosts"]) < 2:
+                pytest.skip("MongoDB is not a replica set with a secondary")
+            await server.read_db.boxes.find_one({})
+            await server.db.boxes.find_one({})
+            return hello["primary"]
+        finally:
+            server.client.close()
+
+    primary = asyncio.run(scenario())
+    read_address, primary_address = recorder.addresses
+    assert read_address != primary
+    assert primary_address == primary